@@ -0,0 +1,310 @@
+import math
+import numpy as np
+
+# Default staking limits, all expressed as fractions of the bankroll
+KELLY_FRACTION = 0.25      # Bet a quarter of the full Kelly stake
+MAX_EXPOSURE = 0.25        # Total amount staked across the whole slate
+MAX_GAME_EXPOSURE = 0.10   # Total amount staked on any single game
+MAX_BET = 0.05             # Amount staked on any single bet
+UNIT_SIZE = 0.01           # One unit is 1% of the bankroll
+
+def american_to_probability(odds_str):
+    """Convert American odds to implied probability
+    +200 means bet 100 to win 200 (underdog, lower probability)
+    -200 means bet 200 to win 100 (favorite, higher probability)
+    """
+    if odds_str is None or (isinstance(odds_str, float) and math.isnan(odds_str)):
+        return None
+    try:
+        odds_str = str(odds_str).strip()
+        is_plus = odds_str.startswith('+')
+        odds = float(odds_str.replace('+', '').replace('-', ''))
+        
+        if is_plus:
+            return 100 / (odds + 100)  # underdog
+        else:
+            return odds / (odds + 100)  # favorite
+    except Exception as e:
+        return None
+
+def american_to_decimal(odds_str):
+    """Convert American odds to decimal odds (total payout per 1 staked)
+    +200 returns 3.00, -200 returns 1.50. Derived from american_to_probability so value bets
+    are staked at the same price they were flagged at.
+    """
+    return 1 / american_to_probability(odds_str)
+
+def game_key(bet):
+    """Identify the game a value bet belongs to."""
+    return (bet['Date'], bet['Team1'], bet['Team2'])
+
+def bet_key(bet):
+    """Identify a value bet across odds updates."""
+    return game_key(bet) + (bet['Bet_Type'],)
+
+def _game_returns(probs, decimal_odds):
+    """
+    Build the outcomes of a single game for the bets placed on it. The bets on a game are
+    mutually exclusive (win / draw / win), so either exactly one of them wins or none do.
+
+    Args:
+    probs (array): Model probability of each bet winning.
+    decimal_odds (array): Decimal odds of each bet.
+
+    Returns:
+    tuple: (outcome probabilities, matrix of net return per unit staked with one row per outcome)
+    """
+    probs = np.asarray(probs, dtype=float)
+    total = probs.sum()
+    if total > 1:
+        probs = probs / total
+        total = 1.0
+    returns = np.full((len(probs) + 1, len(probs)), -1.0)
+    returns[np.arange(len(probs)), np.arange(len(probs))] = np.asarray(decimal_odds) - 1
+    return np.append(probs, 1 - total), returns
+
+def _slate_outcomes(games, n_outcomes):
+    """
+    Stack the outcomes of every game, padded so all games have the same number of outcomes.
+    Padding repeats the game's last outcome (none of its bets win) with zero probability.
+
+    Args:
+    games (list): (outcome probabilities, outcome returns) for each game.
+    n_outcomes (int): Number of outcomes after padding.
+
+    Returns:
+    tuple: (outcome probabilities of shape (games, outcomes),
+            net return per unit staked of shape (games, outcomes, bets per game))
+    """
+    outcome_probs = np.zeros((len(games), n_outcomes))
+    outcome_returns = np.full((len(games), n_outcomes, n_outcomes - 1), -1.0)
+    for row, (probs, returns) in enumerate(games):
+        outcome_probs[row, :len(probs)] = probs
+        outcome_returns[row, :len(probs), :returns.shape[1]] = returns
+        outcome_returns[row, len(probs):, :returns.shape[1]] = returns[-1]
+    return outcome_probs, outcome_returns
+
+def _project_capped(values, upper, cap):
+    """
+    Project each row of values onto {0 <= x <= upper, sum(x) <= cap}. The row sums are piecewise
+    linear in the shift applied to the row, so the exact shift is found from its breakpoints.
+
+    Args:
+    values (array): One row per game, padded with -inf.
+    upper (float): Cap on each entry.
+    cap (float): Cap on the sum of each row.
+
+    Returns:
+    array: The projected rows.
+    """
+    points = np.maximum(np.sort(np.concatenate([values, values - upper], axis=1), axis=1), 0)
+    sums = np.clip(values[:, None, :] - points[:, :, None], 0, upper).sum(axis=2)
+    first = np.argmax(sums <= cap, axis=1)
+    rows = np.arange(len(values))
+    shift = np.where(
+        sums[:, 0] > cap,
+        points[rows, first - 1] + (sums[rows, first - 1] - cap) * (points[rows, first] - points[rows, first - 1])
+        / np.maximum(sums[rows, first - 1] - sums[rows, first], 1e-300),
+        0)
+    return np.clip(values - shift[:, None], 0, upper)
+
+def _project(values, game_matrix, max_bet, max_game, max_total):
+    """Project stakes onto the per-bet, per-game and slate exposure caps."""
+    padded = np.where(game_matrix >= 0, values[game_matrix], -np.inf)
+
+    def project_games(shift):
+        projected = np.zeros_like(values)
+        rows = _project_capped(padded - shift, max_bet, max_game)
+        projected[game_matrix[game_matrix >= 0]] = rows[game_matrix >= 0]
+        return projected
+
+    projected = project_games(0.0)
+    if projected.sum() <= max_total:
+        return projected
+
+    # The slate total is piecewise linear in the shift, so regula falsi (Illinois variant)
+    # lands on the exact shift in a handful of iterations
+    low, high = 0.0, values.max()
+    low_excess, high_excess = projected.sum() - max_total, -max_total
+    side = 0
+    for _ in range(100):
+        shift = high - high_excess * (high - low) / (high_excess - low_excess)
+        projected = project_games(shift)
+        excess = projected.sum() - max_total
+        if abs(excess) < 1e-12:
+            return projected
+        if excess > 0:
+            low, low_excess = shift, excess
+            if side == 1:
+                high_excess /= 2
+            side = 1
+        else:
+            high, high_excess = shift, excess
+            if side == -1:
+                low_excess /= 2
+            side = -1
+    return project_games(high)
+
+def _expected_utility(stakes, outcome_probs, outcome_returns, game_matrix, risk_aversion, grid_size):
+    """
+    Expected utility of the bankroll after the slate and its gradient, -inf if any outcome
+    loses everything. A risk aversion of 1 is the log utility of full Kelly, higher values
+    give fractional Kelly.
+
+    Every game's own outcomes are handled exactly. What the rest of the slate adds to the
+    bankroll is a sum of independent games, so its distribution is built on a grid of
+    grid_size points by convolving the games with FFTs. Mass is split linearly between the
+    two nearest grid points, which keeps its mean exact.
+
+    Returns:
+    tuple: (expected utility, gradient, worst-case bankroll)
+    """
+    padded = np.where(game_matrix >= 0, stakes[game_matrix], 0)
+    game_pnl = np.einsum('gok,gk->go', outcome_returns, padded)
+    game_low = game_pnl.min(axis=1)
+    worst_wealth = 1 + game_low.sum()
+    if worst_wealth <= 0:
+        return -np.inf, None, worst_wealth
+
+    # Grid over the total winnings above the worst case
+    above_low = game_pnl - game_low[:, None]
+    spacing = above_low.max(axis=1).sum() / (grid_size - 1) or 1.0
+    position = above_low / spacing
+    lower = np.minimum(np.floor(position).astype(int), grid_size - 2)
+    upper_weight = position - lower
+    games = np.arange(len(game_pnl))[:, None]
+    masses = np.zeros((len(game_pnl), grid_size))
+    np.add.at(masses, (games, lower), outcome_probs * (1 - upper_weight))
+    np.add.at(masses, (games, lower + 1), outcome_probs * upper_weight)
+
+    # Distribution of every other game's winnings for each game, from prefix and suffix
+    # products of the transforms
+    transforms = np.fft.rfft(masses, axis=1)
+    ones = np.ones((1, transforms.shape[1]))
+    before = np.cumprod(np.vstack([ones, transforms[:-1]]), axis=0)
+    after = np.cumprod(np.vstack([transforms[1:], ones])[::-1], axis=0)[::-1]
+    others = np.fft.irfft(before * after, n=grid_size, axis=1)
+
+    others_low = game_low.sum() - game_low
+    wealth = (1 + others_low[:, None, None] + game_pnl[:, :, None]
+              + spacing * np.arange(grid_size)[None, None, :])
+    log_wealth = np.log(wealth)
+    marginal = np.einsum('gn,gon->go', others, np.exp(-risk_aversion * log_wealth))
+    gradient_rows = np.einsum('go,gok->gk', outcome_probs * marginal, outcome_returns)
+    gradient = np.zeros_like(stakes)
+    gradient[game_matrix[game_matrix >= 0]] = gradient_rows[game_matrix >= 0]
+
+    if risk_aversion == 1:
+        utility = log_wealth[0]
+    else:
+        utility = np.expm1((1 - risk_aversion) * log_wealth[0]) / (1 - risk_aversion)
+    return outcome_probs[0] @ (utility @ others[0]), gradient, worst_wealth
+
+def optimal_stakes(value_bets, kelly_fraction=KELLY_FRACTION, max_exposure=MAX_EXPOSURE,
+                   max_game_exposure=MAX_GAME_EXPOSURE, max_bet=MAX_BET, initial_stakes=None,
+                   grid_size=4096, tol=1e-9, max_iter=500):
+    """
+    Solve fractional Kelly stakes for a whole slate of value bets at once. Bets on the same game
+    are treated as mutually exclusive and games as independent, and the expected utility of the
+    bankroll is maximised over every joint outcome of the slate subject to the exposure caps.
+
+    Args:
+    value_bets (list): Value bet dicts as returned by plot_game_probabilities.
+    kelly_fraction (float): Roughly the fraction of the full Kelly stakes to bet, 1 is full Kelly. Defaults to KELLY_FRACTION.
+    max_exposure (float): Cap on the total stake across the slate. Defaults to MAX_EXPOSURE.
+    max_game_exposure (float): Cap on the total stake on one game. Defaults to MAX_GAME_EXPOSURE.
+    max_bet (float): Cap on the stake of a single bet. Defaults to MAX_BET.
+    initial_stakes (dict, optional): Previous stakes keyed by bet_key, used as a warm start when
+        re-solving after an odds update. Bets without a previous stake start at 0. Defaults to None.
+    grid_size (int): Number of grid points for the winnings of the rest of the slate. Defaults to 4096.
+    tol (float): Stop once the stakes move less than this between iterations. Defaults to 1e-9.
+    max_iter (int): Maximum number of iterations. Defaults to 500.
+
+    Returns:
+    array: Stake for each value bet as a fraction of the bankroll, in the same order as value_bets.
+    """
+    if not 0 < kelly_fraction <= 1:
+        raise ValueError("kelly_fraction must be in (0, 1]")
+    if min(max_exposure, max_game_exposure, max_bet) <= 0:
+        raise ValueError("Exposure caps must be positive")
+    if not value_bets:
+        return np.zeros(0)
+
+    game_indices = {}
+    for i, bet in enumerate(value_bets):
+        game_indices.setdefault(game_key(bet), []).append(i)
+
+    games = []
+    for idx in game_indices.values():
+        probs = [float(value_bets[i]['Model_Prob']) for i in idx]
+        odds = [american_to_decimal(value_bets[i]['Odds']) for i in idx]
+        games.append(_game_returns(probs, odds))
+
+    # Bet indices of each game, padded with -1 so all games can be handled at once
+    game_matrix = np.full((len(games), max(len(idx) for idx in game_indices.values())), -1)
+    for row, idx in enumerate(game_indices.values()):
+        game_matrix[row, :len(idx)] = idx
+    outcome_probs, outcome_returns = _slate_outcomes(games, game_matrix.shape[1] + 1)
+
+    # Fractional Kelly is solved as constant relative risk aversion of 1 / kelly_fraction,
+    # which keeps the caps on the stakes that are actually placed and, unlike scaling down
+    # the full Kelly solution, accounts for how the bets on the slate interact
+    risk_aversion = 1 / kelly_fraction
+    caps = (max_bet, max_game_exposure, max_exposure)
+
+    def utility(stakes):
+        return _expected_utility(stakes, outcome_probs, outcome_returns, game_matrix, risk_aversion, grid_size)
+
+    stakes = np.zeros(len(value_bets))
+    value, gradient, worst = utility(stakes)
+    if initial_stakes is not None:
+        # Match on bet identity since an odds update can add, drop or swap bets
+        warm = np.array([float(initial_stakes.get(bet_key(bet), 0)) for bet in value_bets])
+        warm = _project(warm, game_matrix, *caps)
+        warm_value, warm_gradient, warm_worst = utility(warm)
+        if np.isfinite(warm_value):
+            stakes, value, gradient, worst = warm, warm_value, warm_gradient, warm_worst
+
+    # Projected gradient ascent with Barzilai-Borwein steps and a nonmonotone backtracking
+    # line search against the best of the last few values; the objective is concave so this
+    # converges to the global optimum. A step may at most halve the worst-case bankroll
+    # so the iterates cannot jump right up against the ruin boundary.
+    step = 1.0
+    recent = [value]
+    for _ in range(max_iter):
+        while True:
+            candidate = _project(stakes + step * gradient, game_matrix, *caps)
+            move = candidate - stakes
+            if np.abs(move).max() < tol:
+                return stakes
+            new_value, new_gradient, new_worst = utility(candidate)
+            # The grid leaves a little noise in the utility, so very close to the optimum a
+            # step is accepted as long as it does not do worse than that
+            if new_value >= max(recent) + 1e-4 * gradient @ move - 1e-12 and new_worst >= worst / 2:
+                break
+            step /= 2
+        # Barzilai-Borwein step size for the next iteration
+        curvature = -move @ (new_gradient - gradient)
+        step = min(move @ move / curvature if curvature > 0 else step * 2, 1e6)
+        stakes, value, gradient, worst = candidate, new_value, new_gradient, new_worst
+        recent = recent[-9:] + [value]
+
+    return stakes
+
+def assign_units(value_bets, unit_size=UNIT_SIZE, **kwargs):
+    """
+    Fill in the 'Units' of each value bet with its jointly optimised fractional Kelly stake.
+
+    Args:
+    value_bets (list): Value bet dicts as returned by plot_game_probabilities.
+    unit_size (float): Fraction of the bankroll that one unit represents. Defaults to UNIT_SIZE.
+    **kwargs: Passed on to optimal_stakes.
+
+    Returns:
+    dict: Stake of each value bet as a fraction of the bankroll, keyed by bet_key. Pass it back
+    as initial_stakes to warm start the next solve.
+    """
+    stakes = optimal_stakes(value_bets, **kwargs)
+    for bet, stake in zip(value_bets, stakes):
+        bet['Units'] = round(float(stake / unit_size), 2)
+    return {bet_key(bet): float(stake) for bet, stake in zip(value_bets, stakes)}
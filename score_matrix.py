@@ -6,6 +6,7 @@ from datetime import date
 import math
 import csv
 from pathlib import Path
+from kelly import american_to_probability, assign_units
 
 # Team color dictionary
 color_dict = {
@@ -87,25 +88,6 @@ def poisson_probability_matrix(team1_xG, team2_xG, max_goals=6):
     
     return np.outer(calc_distribution(team1_xG), calc_distribution(team2_xG))
 
-def american_to_probability(odds_str):
-    """Convert American odds to implied probability
-    +200 means bet 100 to win 200 (underdog, lower probability)
-    -200 means bet 200 to win 100 (favorite, higher probability)
-    """
-    if pd.isna(odds_str):
-        return None
-    try:
-        odds_str = str(odds_str).strip()
-        is_plus = odds_str.startswith('+')
-        odds = float(odds_str.replace('+', '').replace('-', ''))
-        
-        if is_plus:
-            return 100 / (odds + 100)  # underdog
-        else:
-            return odds / (odds + 100)  # favorite
-    except Exception as e:
-        return None
-
 def plot_game_probabilities(team1, team2, team1_xG, team2_xG, team1_odds=None, team2_odds=None, draw_odds=None, actual_scores=None):
     """Plot the probability matrix for a game with team colors."""
     score_matrix = poisson_probability_matrix(team1_xG, team2_xG)
@@ -179,7 +161,7 @@ def plot_game_probabilities(team1, team2, team1_xG, team2_xG, team1_odds=None, t
                         'Edge': edge,
                         'Odds': odds,
                         'Result': '',  # To be filled manually
-                        'Units': ''    # To be filled manually
+                        'Units': ''    # Filled in by assign_units
                     })
             
             process_value_line(team1_name, win_team1_prob, book_prob_team1, team1_odds)
@@ -242,8 +224,19 @@ def main():
             )
             all_value_bets.extend(value_bets)
         
-        # Save value bets if any found
+        # Size the slate's value bets jointly and save them if any found
         if all_value_bets:
+            try:
+                assign_units(all_value_bets)
+                print("\nStakes:")
+                print("-" * 40)
+                for bet in all_value_bets:
+                    print(f"{bet['Team1']} vs {bet['Team2']} {bet['Bet_Type']:<15} {bet['Units']:>6.2f} units")
+            except Exception as e:
+                # Still log the value bets, with Units left blank to fill in manually
+                print(f"Error sizing stakes: {e}")
+                for bet in all_value_bets:
+                    bet['Units'] = ''
             save_value_bets(all_value_bets)
             print(f"\nSaved {len(all_value_bets)} value bets to value_bets_log.csv")
 
@@ -0,0 +1,165 @@
+import time
+import numpy as np
+import pytest
+from kelly import (american_to_decimal, american_to_probability, assign_units, bet_key, game_key,
+                   optimal_stakes, _game_returns, _project, _project_capped)
+
+NO_CAPS = dict(max_bet=1, max_game_exposure=1, max_exposure=1)
+
+def make_bet(team1, bet_type, prob, odds):
+    return {'Date': '2025-03-10', 'Team1': team1, 'Team2': 'BUF', 'Bet_Type': bet_type,
+            'Model_Prob': prob, 'Odds': odds, 'Units': ''}
+
+def make_slate(n_games):
+    return [make_bet(f'T{g}', bet_type, prob, odds) for g in range(n_games)
+            for bet_type, prob, odds in [('Win', 0.45 + 0.005 * g, '+150'), ('Draw', 0.25, '+350')]]
+
+def enumerate_slate(bets):
+    """Every joint outcome of the slate with its probability and net return per unit staked."""
+    game_indices = {}
+    for i, bet in enumerate(bets):
+        game_indices.setdefault(game_key(bet), []).append(i)
+    probs, returns = np.ones(1), np.zeros((1, len(bets)))
+    for idx in game_indices.values():
+        game_probs, game_returns = _game_returns([bets[i]['Model_Prob'] for i in idx],
+                                                 [american_to_decimal(bets[i]['Odds']) for i in idx])
+        padded = np.zeros((len(game_probs), len(bets)))
+        padded[:, idx] = game_returns
+        probs = np.outer(probs, game_probs).ravel()
+        returns = (returns[:, None, :] + padded[None, :, :]).reshape(-1, len(bets))
+    return probs, returns, np.array([idx + [-1] * (3 - len(idx)) for idx in game_indices.values()])
+
+def exact_solve(bets, stakes, risk_aversion=4, caps=(0.05, 0.10, 0.25), step=0.05, iterations=300):
+    """Reference solve by plain projected gradient ascent on every enumerated outcome."""
+    probs, returns, game_matrix = enumerate_slate(bets)
+    for _ in range(iterations):
+        gradient = returns.T @ (probs * (1 + returns @ stakes) ** -risk_aversion)
+        stakes = _project(stakes + step * gradient, game_matrix, *caps)
+    return stakes
+
+def dykstra(values, game_matrix, max_bet, max_game, max_total, iterations=5000):
+    """Reference projection by alternating projections onto each cap."""
+    def box(x):
+        return np.clip(x, 0, max_bet)
+
+    def per_game(x):
+        x = x.copy()
+        for row in game_matrix:
+            idx = row[row >= 0]
+            if x[idx].sum() > max_game:
+                x[idx] -= (x[idx].sum() - max_game) / len(idx)
+        return x
+
+    def total(x):
+        return x - max(x.sum() - max_total, 0) / len(x)
+
+    x = values.astype(float)
+    corrections = [np.zeros_like(x) for _ in range(3)]
+    for _ in range(iterations):
+        for i, project in enumerate([box, per_game, total]):
+            y = project(x + corrections[i])
+            corrections[i] = x + corrections[i] - y
+            x = y
+    return x
+
+def test_american_to_decimal():
+    assert american_to_decimal('+200') == pytest.approx(3.0)
+    assert american_to_decimal('-200') == pytest.approx(1.5)
+
+def test_decimal_odds_match_book_probability():
+    # Unsigned odds must be read the same way when flagging and when staking
+    for odds in ['+150', '-150', '150', ' +205 ']:
+        assert american_to_decimal(odds) == pytest.approx(1 / american_to_probability(odds))
+    assert american_to_probability(float('nan')) is None
+
+def test_project_capped_matches_bisection():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        values = rng.normal(size=(1, 3))
+        upper, cap = rng.uniform(0.1, 1), rng.uniform(0.1, 2)
+        low, high = 0.0, 10.0
+        for _ in range(100):
+            shift = (low + high) / 2
+            if np.clip(values[0] - shift, 0, upper).sum() > cap:
+                low = shift
+            else:
+                high = shift
+        expected = np.clip(values[0], 0, upper)
+        if expected.sum() > cap:
+            expected = np.clip(values[0] - high, 0, upper)
+        assert np.allclose(_project_capped(values, upper, cap)[0], expected, atol=1e-9)
+
+def test_project_matches_dykstra():
+    rng = np.random.default_rng(1)
+    game_matrix = np.array([[0, 1, 2], [3, 4, -1], [5, -1, -1]])
+    for _ in range(20):
+        values = rng.normal(scale=0.3, size=6)
+        caps = rng.uniform(0.05, 0.5, size=3)
+        assert np.allclose(_project(values, game_matrix, *caps), dykstra(values, game_matrix, *caps), atol=1e-8)
+
+def test_single_bet_full_kelly():
+    # p = 0.5 at +150: f = (b p - q) / b = 1 / 6
+    stakes = optimal_stakes([make_bet('EDM', 'Win', 0.5, '+150')], kelly_fraction=1, **NO_CAPS)
+    assert stakes[0] == pytest.approx(1 / 6, abs=1e-6)
+
+def test_exclusive_outcomes_full_kelly():
+    # Closed form for mutually exclusive outcomes: f_i = p_i - r / d_i with r = (1 - sum p) / (1 - sum 1 / d)
+    bets = [make_bet('EDM', 'Win', 0.45, '+150'), make_bet('EDM', 'Draw', 0.25, '+350')]
+    reserve = (1 - 0.45 - 0.25) / (1 - 1 / 2.5 - 1 / 4.5)
+    expected = [0.45 - reserve / 2.5, 0.25 - reserve / 4.5]
+    assert np.allclose(optimal_stakes(bets, kelly_fraction=1, **NO_CAPS), expected, atol=1e-6)
+
+def test_negative_edge_gets_no_stake():
+    assert optimal_stakes([make_bet('EDM', 'Win', 0.3, '+150')])[0] == 0
+
+def test_caps_respected():
+    bets = make_slate(8)
+    stakes = optimal_stakes(bets, max_bet=0.02, max_game_exposure=0.03, max_exposure=0.15)
+    assert stakes.min() >= 0
+    assert stakes.max() <= 0.02 + 1e-12
+    assert (stakes[0::2] + stakes[1::2]).max() <= 0.03 + 1e-12
+    assert stakes.sum() <= 0.15 + 1e-9
+
+@pytest.mark.parametrize('bets', [
+    make_slate(10),
+    [make_bet(f'T{g}', 'Win', 0.5 + 0.002 * g, '+150') for g in range(16)],
+], ids=['10 games, 2 bets each', '16 games, 1 bet each'])
+def test_matches_exact_enumeration(bets):
+    stakes = optimal_stakes(bets)
+    assert np.abs(exact_solve(bets, stakes) - stakes).max() < 1e-4
+
+def test_full_slate_identical_bets_get_identical_stakes():
+    bets = [make_bet(f'T{g}', 'Win', 0.5, '+150') for g in range(16)]
+    stakes = optimal_stakes(bets)
+    assert np.ptp(stakes) < 1e-9
+
+def test_full_slate_stakes_increase_with_edge():
+    bets = [make_bet(f'T{g}', 'Win', 0.5 + 0.002 * g, '+150') for g in range(16)]
+    assert np.all(np.diff(optimal_stakes(bets)) > 0)
+
+def test_warm_start_handles_changed_slate():
+    bets = make_slate(4)
+    previous = assign_units(bets)
+    # Bets dropped, added and swapped between odds updates
+    for slate in [bets[:3], bets + [make_bet('NEW', 'Win', 0.5, '+120')],
+                  bets[:3] + [make_bet('T1', 'BUF', 0.35, '+220')]]:
+        # Both solves stop once the grid's noise outweighs the gain, about 1e-6 of the bankroll apart
+        cold = optimal_stakes(slate)
+        assert np.allclose(optimal_stakes(slate, initial_stakes=previous), cold, atol=1e-5)
+
+def test_assign_units():
+    bets = make_slate(2)
+    stakes = assign_units(bets)
+    for bet in bets:
+        assert bet['Units'] == round(stakes[bet_key(bet)] / 0.01, 2)
+
+def test_slate_solves_quickly():
+    bets = make_slate(16)
+    start = time.time()
+    previous = assign_units(bets)
+    cold = time.time() - start
+    bets[0]['Odds'] = '+160'
+    start = time.time()
+    optimal_stakes(bets, initial_stakes=previous)
+    warm = time.time() - start
+    assert cold < 2 and warm < 2